@@ -5,8 +5,8 @@ Example script demonstrating the AG-UI agent.
 This script shows how to use the agent both synchronously and with streaming.
 Before running, make sure you have set up your .env file with API keys.
 """
-import asyncio
-from src.ag_ui_agent import create_agent, run_agent, stream_agent
+import uvloop
+from src.ag_ui_agent import CONFIG, create_agent, run_agent, stream_agent
 
 
 def example_sync():
@@ -61,8 +61,9 @@ async def example_stream():
             
             elif event_type == "on_chat_model_stream":
                 chunk = event.get("data", {}).get("chunk")
-                if chunk and hasattr(chunk, "content") and chunk.content:
-                    print(f"   {chunk.content}", end="", flush=True)
+                content = getattr(chunk, "content", None)
+                if content:
+                    print(f"   {content}", end="", flush=True)
             
             elif event_type == "on_tool_start":
                 tool_name = event.get("name", "unknown")
@@ -86,6 +87,8 @@ async def main():
     print("=" * 60)
     
     try:
+        CONFIG.validate()
+        
         # Run synchronous example
         example_sync()
         
@@ -107,4 +110,4 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    uvloop.run(main())
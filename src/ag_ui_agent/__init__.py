@@ -2,14 +2,17 @@
 
 __version__ = "1.0.0"
 
-from .agent import create_agent, run_agent, stream_agent
-from .config import Config
+from .agent import arun_agent, create_agent, run_agent, run_agent_fast, stream_agent
+from .config import CONFIG, Config
 from .tools import TOOLS, web_search
 
 __all__ = [
+    "arun_agent",
     "create_agent",
     "run_agent", 
+    "run_agent_fast",
     "stream_agent",
+    "CONFIG",
     "Config",
     "TOOLS",
     "web_search",
@@ -1,20 +1,39 @@
 """LangGraph agent implementation."""
+import asyncio
+import functools
 from typing import Annotated
 from typing_extensions import TypedDict
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode, tools_condition
+from langgraph.prebuilt import ToolNode
+from langchain_core.messages import SystemMessage
+from langchain_core.runnables import RunnableLambda
 from langchain_openai import ChatOpenAI
-from .config import Config
+from .config import CONFIG
 from .tools import TOOLS
 
 
+# Kept constant so backends with prefix caching can reuse it across requests
+SYSTEM_PROMPT = (
+    "You are a helpful assistant with access to a web search tool. "
+    "Use web search when a question needs current information, news, or facts "
+    "you are not sure about; otherwise answer directly."
+)
+
+
 # Define the state for our graph
 class State(TypedDict):
     """State of the agent conversation."""
     messages: Annotated[list, add_messages]
 
 
+def _route_after_agent(state: State):
+    """Route to the tools node if the last message requested tool calls."""
+    if getattr(state["messages"][-1], "tool_calls", None):
+        return "tools"
+    return END
+
+
 def create_agent():
     """
     Create and return a LangGraph agent with web search capabilities.
@@ -25,18 +44,62 @@ def create_agent():
     3. If tools are needed, execute them
     4. Generate final response using LLM
     
+    The compiled graph is cached, so repeated calls with the same
+    configuration return the same agent instead of rebuilding it.
+    
     Returns:
         Compiled LangGraph agent
     """
-    # Initialize the LLM with tools
-    llm = ChatOpenAI(
-        model=Config.OPENAI_MODEL,
-        temperature=Config.TEMPERATURE,
-        max_tokens=Config.MAX_TOKENS,
-        api_key=Config.OPENAI_API_KEY,
-        base_url=Config.OPENAI_ENDPOINT,
+    return _build_agent(_llm_settings(), CONFIG.PROMPT_CACHE_CONTROL)
+
+
+def _llm_settings():
+    """Return the configured LLM settings used as the cache key."""
+    return (
+        CONFIG.OPENAI_MODEL,
+        CONFIG.TEMPERATURE,
+        CONFIG.MAX_TOKENS,
+        CONFIG.OPENAI_API_KEY,
+        CONFIG.OPENAI_ENDPOINT,
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _build_llm(model, temperature, max_tokens, api_key, base_url):
+    """Build the chat model for the given LLM settings."""
+    return ChatOpenAI(
+        model=model,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        api_key=api_key,
+        base_url=base_url,
         streaming=True,
     )
+
+
+@functools.lru_cache(maxsize=2)
+def _system_message(cache_control: bool) -> SystemMessage:
+    """
+    Build the system message that starts every LLM request.
+    
+    With cache_control, the prompt carries an Anthropic-style ephemeral cache
+    marker, which OpenAI-compatible proxies for Anthropic models forward so
+    the unchanging prefix is served from the prompt cache.
+    """
+    if not cache_control:
+        return SystemMessage(content=SYSTEM_PROMPT)
+    return SystemMessage(content=[{
+        "type": "text",
+        "text": SYSTEM_PROMPT,
+        "cache_control": {"type": "ephemeral"},
+    }])
+
+
+@functools.lru_cache(maxsize=1)
+def _build_agent(llm_settings, cache_control):
+    """Build and compile the agent graph for the given LLM settings."""
+    llm = _build_llm(*llm_settings)
+    system_message = _system_message(cache_control)
     
     # Bind tools to the LLM
     llm_with_tools = llm.bind_tools(TOOLS)
@@ -44,13 +107,20 @@ def create_agent():
     # Define the agent node
     def agent(state: State):
         """Agent node that calls the LLM."""
-        return {"messages": [llm_with_tools.invoke(state["messages"])]}
+        messages = [system_message, *state["messages"]]
+        return {"messages": [llm_with_tools.invoke(messages)]}
+    
+    async def aagent(state: State):
+        """Async agent node, used by ainvoke() and astream_events()."""
+        messages = [system_message, *state["messages"]]
+        return {"messages": [await llm_with_tools.ainvoke(messages)]}
     
     # Create the graph
     graph_builder = StateGraph(State)
     
     # Add nodes
-    graph_builder.add_node("agent", agent)
+    # Async callers get the async node so LLM calls never block the event loop
+    graph_builder.add_node("agent", RunnableLambda(agent, afunc=aagent))
     graph_builder.add_node("tools", ToolNode(TOOLS))
     
     # Add edges
@@ -62,7 +132,8 @@ def create_agent():
     # 2. End if the agent has a final response
     graph_builder.add_conditional_edges(
         "agent",
-        tools_condition,
+        _route_after_agent,
+        ["tools", END],
     )
     
     # After tools are executed, always go back to the agent
@@ -72,13 +143,46 @@ def create_agent():
     return graph_builder.compile()
 
 
+async def warmup_agent(timeout: float = 10.0):
+    """
+    Send a one-token request so the LLM connection is open before the first user request.
+    
+    Args:
+        timeout: Seconds to wait for the warmup response
+    """
+    llm = _build_llm(*_llm_settings()).bind(max_tokens=1)
+    # The servers only call the LLM through its async client
+    await asyncio.wait_for(llm.ainvoke("ping"), timeout)
+
+
+async def run_agent_fast(question: str):
+    """
+    Answer a question with a single LLM call, skipping the agent graph.
+    
+    Intended for simple questions that do not need web search; the LLM has
+    no tools bound, so it always answers directly.
+    
+    Args:
+        question: The user's question
+        
+    Returns:
+        The LLM's response
+    """
+    llm = _build_llm(*_llm_settings())
+    response = await llm.ainvoke([
+        _system_message(CONFIG.PROMPT_CACHE_CONTROL),
+        ("user", question),
+    ])
+    return response.content
+
+
 def run_agent(question: str, agent=None):
     """
     Run the agent with a given question.
     
     Args:
         question: The user's question
-        agent: Optional pre-compiled agent (will create if not provided)
+        agent: Optional pre-compiled agent (uses the cached agent if not provided)
         
     Returns:
         The agent's response
@@ -90,8 +194,31 @@ def run_agent(question: str, agent=None):
     result = agent.invoke({
         "messages": [("user", question)]
     })
+    return _final_content(result)
+
+
+async def arun_agent(question: str, agent=None):
+    """
+    Run the agent with a given question without blocking the event loop.
     
-    # Extract the final message
+    Args:
+        question: The user's question
+        agent: Optional pre-compiled agent (uses the cached agent if not provided)
+        
+    Returns:
+        The agent's response
+    """
+    if agent is None:
+        agent = create_agent()
+    
+    result = await agent.ainvoke({
+        "messages": [("user", question)]
+    })
+    return _final_content(result)
+
+
+def _final_content(result) -> str:
+    """Extract the text of the final message from an agent result."""
     if result and "messages" in result:
         final_message = result["messages"][-1]
         return final_message.content if hasattr(final_message, "content") else str(final_message)
@@ -99,13 +226,16 @@ def run_agent(question: str, agent=None):
     return "No response generated"
 
 
-async def stream_agent(question: str, agent=None):
+async def stream_agent(question: str, agent=None, include_types=("chat_model", "tool")):
     """
     Stream the agent's response for a given question.
     
     Args:
         question: The user's question
-        agent: Optional pre-compiled agent (will create if not provided)
+        agent: Optional pre-compiled agent (uses the cached agent if not provided)
+        include_types: Run types to emit events for; events for other runs
+            (graph nodes, chains, prompts) are filtered out by LangGraph.
+            Pass None to receive every event.
         
     Yields:
         Events from the agent execution
@@ -116,6 +246,7 @@ async def stream_agent(question: str, agent=None):
     # Stream the agent execution
     async for event in agent.astream_events(
         {"messages": [("user", question)]},
-        version="v2"
+        version="v2",
+        include_types=list(include_types) if include_types else None,
     ):
         yield event
@@ -1,40 +1,61 @@
 """Configuration management for AG-UI Agent."""
 import os
+from dataclasses import dataclass
+from typing import Optional
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 
-class Config:
-    """Configuration class for the agent."""
+@dataclass(frozen=True, slots=True)
+class _Config:
+    """Configuration for the agent, read once from the environment."""
     
     # API Keys
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
+    OPENAI_API_KEY: Optional[str]
+    TAVILY_API_KEY: Optional[str]
     
     # Model Configuration
-    OPENAI_ENDPOINT = os.getenv("OPENAI_ENDPOINT", "https://api.openai.com/v1")  # Custom endpoint for OpenAI-compatible APIs
-    OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-    TEMPERATURE = float(os.getenv("TEMPERATURE", "0.7"))
-    MAX_TOKENS = int(os.getenv("MAX_TOKENS", "2000"))
+    OPENAI_ENDPOINT: str  # Custom endpoint for OpenAI-compatible APIs
+    OPENAI_MODEL: str
+    TEMPERATURE: float
+    MAX_TOKENS: int
+    PROMPT_CACHE_CONTROL: bool  # Mark the system prompt cacheable for Anthropic-compatible backends
+    WARMUP_LLM: bool  # Send a one-token request on startup to open the LLM connections
     
     # Server Configuration
-    HOST = os.getenv("HOST", "0.0.0.0")
-    PORT = int(os.getenv("PORT", "8000"))
+    HOST: str
+    PORT: int
     
     # Tavily Configuration
-    TAVILY_MAX_RESULTS = int(os.getenv("TAVILY_MAX_RESULTS", "5"))
+    TAVILY_MAX_RESULTS: int
     
     @classmethod
-    def validate(cls):
+    def from_env(cls):
+        """Build the configuration from environment variables."""
+        return cls(
+            OPENAI_API_KEY=os.getenv("OPENAI_API_KEY"),
+            TAVILY_API_KEY=os.getenv("TAVILY_API_KEY"),
+            OPENAI_ENDPOINT=os.getenv("OPENAI_ENDPOINT", "https://api.openai.com/v1"),
+            OPENAI_MODEL=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+            TEMPERATURE=float(os.getenv("TEMPERATURE", "0.7")),
+            MAX_TOKENS=int(os.getenv("MAX_TOKENS", "2000")),
+            PROMPT_CACHE_CONTROL=os.getenv("PROMPT_CACHE_CONTROL", "false").lower() in ("1", "true", "yes"),
+            WARMUP_LLM=os.getenv("WARMUP_LLM", "true").lower() in ("1", "true", "yes"),
+            HOST=os.getenv("HOST", "0.0.0.0"),
+            PORT=int(os.getenv("PORT", "8000")),
+            TAVILY_MAX_RESULTS=int(os.getenv("TAVILY_MAX_RESULTS", "5")),
+        )
+    
+    def validate(self):
         """Validate that required configuration is present."""
         errors = []
         
-        if not cls.OPENAI_API_KEY:
+        if not self.OPENAI_API_KEY:
             errors.append("OPENAI_API_KEY environment variable is required")
         
-        if not cls.TAVILY_API_KEY:
+        if not self.TAVILY_API_KEY:
             errors.append("TAVILY_API_KEY environment variable is required")
         
         if errors:
@@ -43,9 +64,7 @@ class Config:
             )
 
 
-# Validate configuration on import
-try:
-    Config.validate()
-except ValueError as e:
-    print(f"Warning: {e}")
-    print("Please set the required environment variables before running the agent.")
+CONFIG = _Config.from_env()
+
+# Kept for code written against the former Config class
+Config = CONFIG
@@ -1,21 +1,53 @@
 """AG-UI protocol server implementation."""
-import json
 import asyncio
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import Any, Optional
+import orjson
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from sse_starlette.sse import EventSourceResponse
-from .agent import create_agent, stream_agent
-from .config import Config
+from .agent import arun_agent, create_agent, run_agent_fast, stream_agent, warmup_agent
+from .config import CONFIG
+from .streaming import STREAMING_METADATA, tool_output_preview
+from .tools import aclose_http_clients
 
 
-# Initialize FastAPI app
+# Initialize agent
+agent = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize the agent and warm up the LLM on startup; close HTTP clients on shutdown."""
+    global agent
+    print("Initializing LangGraph agent...")
+    agent = create_agent()
+    print(f"Agent initialized with model: {CONFIG.OPENAI_MODEL}")
+    
+    if CONFIG.WARMUP_LLM:
+        try:
+            await warmup_agent()
+            print("LLM connection warmed up")
+        except Exception as e:
+            print(f"Warning: LLM warmup failed: {e}")
+    
+    yield
+    
+    await aclose_http_clients()
+
+
+# Refuse to start without the required API keys
+CONFIG.validate()
+
+# Initialize FastAPI app; JSON routes declare their return type so FastAPI
+# serializes them with Pydantic straight to bytes
 app = FastAPI(
     title="AG-UI Agent Server",
     description="LangGraph agent server implementing the AG-UI protocol",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -27,14 +59,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize agent
-agent = None
+# Static events are encoded once at import instead of on every request
+_PROCESSING_EVENT = {
+    "event": "state_update",
+    "data": orjson.dumps({
+        "type": "state_update",
+        "content": "processing",
+        "metadata": {"model": CONFIG.OPENAI_MODEL}
+    }).decode()
+}
+_ERROR_DATA_PREFIX = '{"type":"error","content":'
+_ERROR_DATA_SUFFIX = ',"metadata":{}}'
+
+# Maximum number of queued agent events coalesced per batch
+_MAX_BATCHED_EVENTS = 16
+
+# Marks the end of the agent event queue
+_END_OF_STREAM = object()
 
 
 class ChatMessage(BaseModel):
     """Chat message request model."""
     message: str
     conversation_id: Optional[str] = None
+    bypass_tools: bool = False  # Answer with a single LLM call, without web search
 
 
 class StateResponse(BaseModel):
@@ -44,17 +92,100 @@ class StateResponse(BaseModel):
     temperature: float
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize the agent on startup."""
-    global agent
-    print("Initializing LangGraph agent...")
-    agent = create_agent()
-    print(f"Agent initialized with model: {Config.OPENAI_MODEL}")
+def _encode_message(content: str) -> dict:
+    """Encode streamed LLM content as a message event."""
+    return {
+        "event": "message",
+        "data": orjson.dumps({
+            "type": "message",
+            "content": content,
+            "metadata": STREAMING_METADATA
+        }).decode()
+    }
+
+
+def _encode_tool_start(event: dict) -> dict:
+    """Encode an on_tool_start agent event as a tool_start event."""
+    return {
+        "event": "tool_start",
+        "data": orjson.dumps({
+            "type": "tool_start",
+            "content": event.get("name", "unknown"),
+            "metadata": {
+                "tool_input": event.get("data", {}).get("input", {})
+            }
+        }).decode()
+    }
+
+
+def _encode_tool_end(event: dict) -> dict:
+    """Encode an on_tool_end agent event as a tool_end event."""
+    tool_output = event.get("data", {}).get("output")
+    return {
+        "event": "tool_end",
+        "data": orjson.dumps({
+            "type": "tool_end",
+            "content": event.get("name", "unknown"),
+            "metadata": {
+                "tool_output": tool_output_preview(tool_output)
+            }
+        }).decode()
+    }
+
+
+# Encoders for agent events forwarded as-is to the client
+_EVENT_ENCODERS = {
+    "on_tool_start": _encode_tool_start,
+    "on_tool_end": _encode_tool_end,
+}
+
+
+async def _pump_events(events, queue: asyncio.Queue):
+    """Forward agent events into a queue, followed by the end sentinel."""
+    try:
+        async for event in events:
+            await queue.put(event)
+    except Exception as e:
+        await queue.put(e)
+    await queue.put(_END_OF_STREAM)
+
+
+async def _batched_events(events, max_batch: int = _MAX_BATCHED_EVENTS):
+    """
+    Yield agent events in batches of whatever is already queued.
+    
+    Events are read on a background task so that chunks arriving while the
+    consumer is busy sending can be drained together with get_nowait().
+    The queue holds at most max_batch events, so a stalled client pauses the
+    agent stream instead of buffering it in memory. Errors raised by the
+    agent stream are re-raised after the events that preceded them.
+    """
+    queue = asyncio.Queue(maxsize=max_batch)
+    pump = asyncio.create_task(_pump_events(events, queue))
+    try:
+        while True:
+            item = await queue.get()
+            batch = []
+            while True:
+                if item is _END_OF_STREAM:
+                    if batch:
+                        yield batch
+                    return
+                if isinstance(item, Exception):
+                    if batch:
+                        yield batch
+                    raise item
+                batch.append(item)
+                if len(batch) >= max_batch or queue.empty():
+                    break
+                item = queue.get_nowait()
+            yield batch
+    finally:
+        pump.cancel()
 
 
 @app.get("/")
-async def root():
+async def root() -> dict[str, Any]:
     """Root endpoint."""
     return {
         "message": "AG-UI Agent Server",
@@ -64,32 +195,35 @@ async def root():
 
 
 @app.get("/api/state")
-async def get_state():
+async def get_state() -> StateResponse:
     """Get current agent state."""
     return StateResponse(
         status="ready",
-        model=Config.OPENAI_MODEL,
-        temperature=Config.TEMPERATURE
+        model=CONFIG.OPENAI_MODEL,
+        temperature=CONFIG.TEMPERATURE
     )
 
 
 @app.post("/api/chat")
-async def chat(message: ChatMessage):
+async def chat(message: ChatMessage) -> dict[str, Any]:
     """
     Process a chat message and return the complete response.
     
     This is a non-streaming endpoint for simple request-response interactions.
+    Set bypass_tools to answer with a single LLM call instead of running the
+    full agent graph; the model then cannot search the web.
     """
-    from .agent import run_agent
-    
     try:
-        response = run_agent(message.message, agent)
+        if message.bypass_tools:
+            response = await run_agent_fast(message.message)
+        else:
+            response = await arun_agent(message.message, agent)
         return {
             "type": "message",
             "content": response,
             "metadata": {
                 "conversation_id": message.conversation_id,
-                "model": Config.OPENAI_MODEL
+                "model": CONFIG.OPENAI_MODEL
             }
         }
     except Exception as e:
@@ -101,7 +235,7 @@ async def chat(message: ChatMessage):
 
 
 @app.get("/api/stream")
-async def stream_chat(message: str):
+async def stream_chat(message: str, echo: bool = False):
     """
     Stream agent responses using Server-Sent Events (SSE).
     
@@ -111,100 +245,79 @@ async def stream_chat(message: str):
     - tool_start: Tool execution started
     - tool_end: Tool execution completed
     - state_update: Agent state changes
+    
+    The completion event reports the number of streamed chunks; pass
+    echo=true to also include the full response text.
     """
     async def event_generator():
         """Generate SSE events from agent execution."""
         try:
             # Send initial state update
-            yield {
-                "event": "state_update",
-                "data": json.dumps({
-                    "type": "state_update",
-                    "content": "processing",
-                    "metadata": {"model": Config.OPENAI_MODEL}
-                })
-            }
+            yield _PROCESSING_EVENT
             
-            current_tool = None
-            message_content = []
+            token_count = 0
+            message_content = [] if echo else None
+            pending = []
             
-            # Stream events from the agent
-            async for event in stream_agent(message, agent):
-                event_type = event.get("event")
-                
-                # Handle different event types
-                if event_type == "on_chat_model_stream":
-                    # Streaming content from the LLM
-                    chunk = event.get("data", {}).get("chunk")
-                    if chunk and hasattr(chunk, "content") and chunk.content:
-                        message_content.append(chunk.content)
-                        yield {
-                            "event": "message",
-                            "data": json.dumps({
-                                "type": "message",
-                                "content": chunk.content,
-                                "metadata": {"streaming": True}
-                            })
-                        }
-                
-                elif event_type == "on_tool_start":
-                    # Tool execution started
-                    tool_name = event.get("name", "unknown")
-                    current_tool = tool_name
-                    yield {
-                        "event": "tool_start",
-                        "data": json.dumps({
-                            "type": "tool_start",
-                            "content": tool_name,
-                            "metadata": {
-                                "tool_input": event.get("data", {}).get("input", {})
-                            }
-                        })
-                    }
+            # Stream events from the agent, coalescing chunks that queued up
+            # while the previous frame was being sent
+            async for batch in _batched_events(stream_agent(message, agent)):
+                for event in batch:
+                    event_type = event.get("event")
+                    
+                    if event_type == "on_chat_model_stream":
+                        # Streaming content from the LLM
+                        chunk = event.get("data", {}).get("chunk")
+                        content = getattr(chunk, "content", None)
+                        if content:
+                            pending.append(content)
+                        continue
+                    
+                    encode = _EVENT_ENCODERS.get(event_type)
+                    if encode is None:
+                        continue
+                    
+                    # Keep message chunks ordered before the tool event
+                    if pending:
+                        token_count += len(pending)
+                        if echo:
+                            message_content.extend(pending)
+                        yield _encode_message("".join(pending))
+                        pending.clear()
+                    yield encode(event)
                 
-                elif event_type == "on_tool_end":
-                    # Tool execution completed
-                    tool_output = event.get("data", {}).get("output")
-                    yield {
-                        "event": "tool_end",
-                        "data": json.dumps({
-                            "type": "tool_end",
-                            "content": current_tool or "unknown",
-                            "metadata": {
-                                "tool_output": str(tool_output)[:500]  # Truncate for brevity
-                            }
-                        })
-                    }
-                    current_tool = None
+                if pending:
+                    token_count += len(pending)
+                    if echo:
+                        message_content.extend(pending)
+                    yield _encode_message("".join(pending))
+                    pending.clear()
             
             # Send completion state
+            metadata = {"tokens": token_count}
+            if echo:
+                metadata["full_response"] = "".join(message_content)
             yield {
                 "event": "state_update",
-                "data": json.dumps({
+                "data": orjson.dumps({
                     "type": "state_update",
                     "content": "completed",
-                    "metadata": {
-                        "full_response": "".join(message_content)
-                    }
-                })
+                    "metadata": metadata
+                }).decode()
             }
             
         except Exception as e:
             # Send error event
             yield {
                 "event": "error",
-                "data": json.dumps({
-                    "type": "error",
-                    "content": str(e),
-                    "metadata": {}
-                })
+                "data": _ERROR_DATA_PREFIX + orjson.dumps(str(e)).decode() + _ERROR_DATA_SUFFIX
             }
     
     return EventSourceResponse(event_generator())
 
 
 @app.get("/health")
-async def health_check():
+async def health_check() -> dict[str, Any]:
     """Health check endpoint."""
     return {"status": "healthy"}
 
@@ -213,7 +326,8 @@ if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
         app,
-        host=Config.HOST,
-        port=Config.PORT,
+        host=CONFIG.HOST,
+        port=CONFIG.PORT,
+        loop="uvloop",
         log_level="info"
     )
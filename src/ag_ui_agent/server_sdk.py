@@ -1,18 +1,63 @@
 """AG-UI protocol server implementation using ag-ui-langgraph SDK."""
+import asyncio
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, Optional
+import orjson
 from ag_ui_langgraph import add_langgraph_fastapi_endpoint
-from .agent import create_agent
-from .config import Config
+from .agent import arun_agent, create_agent, stream_agent, warmup_agent
+from .config import CONFIG
+from .streaming import STREAMING_METADATA, tool_output_preview
+from .tools import aclose_http_clients
 
 
-# Initialize FastAPI app
+# Initialize agent
+agent = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize the agent and warm up the LLM on startup; close HTTP clients on shutdown."""
+    global agent
+    print("Initializing LangGraph agent...")
+    agent = create_agent()
+    print(f"✓ Agent initialized with model: {CONFIG.OPENAI_MODEL}")
+    
+    # Add AG-UI protocol endpoint using the SDK
+    add_langgraph_fastapi_endpoint(
+        app=app,
+        agent=agent,
+        path="/api/run_agent",
+        # Optional configuration can be added here
+    )
+    print("✓ AG-UI protocol endpoint added at /api/run_agent")
+    
+    if CONFIG.WARMUP_LLM:
+        try:
+            await warmup_agent()
+            print("✓ LLM connection warmed up")
+        except Exception as e:
+            print(f"Warning: LLM warmup failed: {e}")
+    
+    yield
+    
+    await aclose_http_clients()
+
+
+# Refuse to start without the required API keys
+CONFIG.validate()
+
+# Initialize FastAPI app; JSON routes declare their return type so FastAPI
+# serializes them with Pydantic straight to bytes
 app = FastAPI(
     title="AG-UI Agent Server",
     description="LangGraph agent server implementing the AG-UI protocol with ag-ui-langgraph SDK",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -24,8 +69,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize agent
-agent = None
+# Message frames are coalesced into one write until either limit is reached;
+# the delay is enforced even while the agent is stalled between events
+_MAX_PENDING_FRAMES = 8
+_MAX_FLUSH_DELAY = 0.02  # seconds
+
+
+def _sse_frame(event: bytes, payload: dict) -> bytes:
+    """Encode a payload as a Server-Sent Events frame."""
+    return b"event: " + event + b"\ndata: " + orjson.dumps(payload) + b"\n\n"
+
+
+# Prebuilt frames for the start of every stream and the error envelope
+_PROCESSING_FRAME = _sse_frame(b"state_update", {"type": "state_update", "content": "processing", "metadata": {"model": CONFIG.OPENAI_MODEL}})
+_ERROR_FRAME_PREFIX = b'event: error\ndata: {"type":"error","content":'
+_ERROR_FRAME_SUFFIX = b',"metadata":{}}\n\n'
 
 
 class ChatMessage(BaseModel):
@@ -41,26 +99,8 @@ class StateResponse(BaseModel):
     temperature: float
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize the agent on startup."""
-    global agent
-    print("Initializing LangGraph agent...")
-    agent = create_agent()
-    print(f"✓ Agent initialized with model: {Config.OPENAI_MODEL}")
-    
-    # Add AG-UI protocol endpoint using the SDK
-    add_langgraph_fastapi_endpoint(
-        app=app,
-        agent=agent,
-        path="/api/run_agent",
-        # Optional configuration can be added here
-    )
-    print("✓ AG-UI protocol endpoint added at /api/run_agent")
-
-
 @app.get("/")
-async def root():
+async def root() -> dict[str, Any]:
     """Root endpoint."""
     return {
         "message": "AG-UI Agent Server (ag-ui-langgraph SDK)",
@@ -78,32 +118,30 @@ async def root():
 
 
 @app.get("/api/state")
-async def get_state():
+async def get_state() -> StateResponse:
     """Get current agent state."""
     return StateResponse(
         status="ready",
-        model=Config.OPENAI_MODEL,
-        temperature=Config.TEMPERATURE
+        model=CONFIG.OPENAI_MODEL,
+        temperature=CONFIG.TEMPERATURE
     )
 
 
 @app.post("/api/chat")
-async def chat(message: ChatMessage):
+async def chat(message: ChatMessage) -> dict[str, Any]:
     """
     Process a chat message and return the complete response.
     
     This is a non-streaming endpoint for simple request-response interactions.
     """
-    from .agent import run_agent
-    
     try:
-        response = run_agent(message.message, agent)
+        response = await arun_agent(message.message, agent)
         return {
             "type": "message",
             "content": response,
             "metadata": {
                 "conversation_id": message.conversation_id,
-                "model": Config.OPENAI_MODEL
+                "model": CONFIG.OPENAI_MODEL
             }
         }
     except Exception as e:
@@ -115,57 +153,107 @@ async def chat(message: ChatMessage):
 
 
 @app.get("/api/stream")
-async def stream_chat(message: str):
+async def stream_chat(message: str, echo: bool = False):
     """
     Stream agent responses (legacy endpoint).
     
     For full AG-UI protocol support, use POST /api/run_agent instead.
     This endpoint provides simple streaming for basic use cases.
+    Pass echo=true to include the full response text in the completion event.
     """
-    from fastapi.responses import StreamingResponse
-    import json
-    
     async def event_generator():
         """Generate SSE events from agent execution."""
+        pending = []
+        events = aiter(stream_agent(message, agent))
+        next_event = None
         try:
-            from .agent import stream_agent
-            
             # Send initial state update
-            yield f"event: state_update\ndata: {json.dumps({'type': 'state_update', 'content': 'processing', 'metadata': {'model': Config.OPENAI_MODEL}})}\n\n"
+            yield _PROCESSING_FRAME
             
             current_tool = None
-            message_content = []
+            token_count = 0
+            message_content = [] if echo else None
+            last_flush = time.monotonic()
             
             # Stream events from the agent
-            async for event in stream_agent(message, agent):
+            while True:
+                try:
+                    if pending:
+                        # Send buffered chunks once they are due, even if the
+                        # agent stalls before producing its next event
+                        if next_event is None:
+                            next_event = asyncio.ensure_future(anext(events))
+                        timeout = max(last_flush + _MAX_FLUSH_DELAY - time.monotonic(), 0)
+                        done, _ = await asyncio.wait((next_event,), timeout=timeout)
+                        if not done:
+                            yield b"".join(pending)
+                            pending.clear()
+                            last_flush = time.monotonic()
+                            continue
+                    if next_event is not None:
+                        event = await next_event
+                        next_event = None
+                    else:
+                        event = await anext(events)
+                except StopAsyncIteration:
+                    break
+                
                 event_type = event.get("event")
                 
                 # Handle different event types
                 if event_type == "on_chat_model_stream":
                     # Streaming content from the LLM
                     chunk = event.get("data", {}).get("chunk")
-                    if chunk and hasattr(chunk, "content") and chunk.content:
-                        message_content.append(chunk.content)
-                        yield f"event: message\ndata: {json.dumps({'type': 'message', 'content': chunk.content, 'metadata': {'streaming': True}})}\n\n"
+                    content = getattr(chunk, "content", None)
+                    if content:
+                        token_count += 1
+                        if echo:
+                            message_content.append(content)
+                        pending.append(_sse_frame(b"message", {"type": "message", "content": content, "metadata": STREAMING_METADATA}))
+                        now = time.monotonic()
+                        if len(pending) >= _MAX_PENDING_FRAMES or now - last_flush > _MAX_FLUSH_DELAY:
+                            yield b"".join(pending)
+                            pending.clear()
+                            last_flush = now
+                    continue
+                
+                # Any other event ends a burst of chunks, so send them first
+                if pending:
+                    yield b"".join(pending)
+                    pending.clear()
+                    last_flush = time.monotonic()
                 
-                elif event_type == "on_tool_start":
+                if event_type == "on_tool_start":
                     # Tool execution started
                     tool_name = event.get("name", "unknown")
                     current_tool = tool_name
-                    yield f"event: tool_start\ndata: {json.dumps({'type': 'tool_start', 'content': tool_name, 'metadata': {'tool_input': event.get('data', {}).get('input', {})}})}\n\n"
+                    yield _sse_frame(b"tool_start", {"type": "tool_start", "content": tool_name, "metadata": {"tool_input": event.get("data", {}).get("input", {})}})
                 
                 elif event_type == "on_tool_end":
                     # Tool execution completed
                     tool_output = event.get("data", {}).get("output")
-                    yield f"event: tool_end\ndata: {json.dumps({'type': 'tool_end', 'content': current_tool or 'unknown', 'metadata': {'tool_output': str(tool_output)[:500]}})}\n\n"
+                    yield _sse_frame(b"tool_end", {"type": "tool_end", "content": current_tool or "unknown", "metadata": {"tool_output": tool_output_preview(tool_output)}})
                     current_tool = None
             
+            if pending:
+                yield b"".join(pending)
+                pending.clear()
+            
             # Send completion state
-            yield f"event: state_update\ndata: {json.dumps({'type': 'state_update', 'content': 'completed', 'metadata': {'full_response': ''.join(message_content)}})}\n\n"
+            metadata = {"tokens": token_count}
+            if echo:
+                metadata["full_response"] = "".join(message_content)
+            yield _sse_frame(b"state_update", {"type": "state_update", "content": "completed", "metadata": metadata})
             
         except Exception as e:
-            # Send error event
-            yield f"event: error\ndata: {json.dumps({'type': 'error', 'content': str(e), 'metadata': {}})}\n\n"
+            # Send error event after any chunks already produced
+            if pending:
+                yield b"".join(pending)
+            yield _ERROR_FRAME_PREFIX + orjson.dumps(str(e)) + _ERROR_FRAME_SUFFIX
+        finally:
+            # Stop waiting on the agent if the client went away mid-stream
+            if next_event is not None:
+                next_event.cancel()
     
     return StreamingResponse(
         event_generator(),
@@ -178,7 +266,7 @@ async def stream_chat(message: str):
 
 
 @app.get("/health")
-async def health_check():
+async def health_check() -> dict[str, Any]:
     """Health check endpoint."""
     return {
         "status": "healthy",
@@ -191,7 +279,8 @@ if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
         app,
-        host=Config.HOST,
-        port=Config.PORT,
+        host=CONFIG.HOST,
+        port=CONFIG.PORT,
+        loop="uvloop",
         log_level="info"
     )
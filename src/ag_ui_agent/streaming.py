@@ -0,0 +1,14 @@
+"""Helpers shared by the streaming servers."""
+
+
+# Metadata shared by every streamed message chunk
+STREAMING_METADATA = {"streaming": True}
+
+
+def tool_output_preview(output, limit: int = 500) -> str:
+    """Return the start of a tool's output for display, without its message wrapper."""
+    # ToolNode wraps results in a ToolMessage; the text is in its content
+    content = getattr(output, "content", output)
+    if not isinstance(content, str):
+        content = str(content)
+    return content[:limit]
@@ -1,16 +1,60 @@
 """Web search and other tools for the agent."""
 from typing import Annotated
-from langchain_core.tools import tool
-from tavily import TavilyClient
-from .config import Config
+import httpx
+from langchain_core.tools import StructuredTool
+from .config import CONFIG
 
 
-# Initialize Tavily client
-tavily_client = TavilyClient(api_key=Config.TAVILY_API_KEY) if Config.TAVILY_API_KEY else None
+TAVILY_SEARCH_URL = "https://api.tavily.com/search"
 
+# Longest snippet kept per search result
+MAX_RESULT_CONTENT_CHARS = 800
 
-@tool
-def web_search(query: Annotated[str, "The search query to look up on the web"]) -> str:
+# Shared HTTP clients so searches reuse pooled keep-alive connections.
+# The async client serves both servers without blocking the event loop; the
+# sync client only serves library callers of run_agent() and agent.invoke().
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20)
+_http_client = httpx.Client(http2=True, timeout=20, limits=_HTTP_LIMITS)
+_async_http_client = httpx.AsyncClient(http2=True, timeout=20, limits=_HTTP_LIMITS)
+
+
+async def aclose_http_clients():
+    """Close the shared HTTP clients and their pooled connections on shutdown."""
+    _http_client.close()
+    await _async_http_client.aclose()
+
+
+def _search_request(query: str) -> dict:
+    """Build the keyword arguments for a Tavily search request."""
+    return {
+        "json": {
+            "query": query,
+            "max_results": CONFIG.TAVILY_MAX_RESULTS,
+            "search_depth": "advanced",
+        },
+        "headers": {"Authorization": f"Bearer {CONFIG.TAVILY_API_KEY}"},
+    }
+
+
+def _format_results(query: str, response: dict) -> str:
+    """Format a Tavily search response for the LLM."""
+    results = response.get("results")
+    if not results:
+        return f"No results found for query: {query}"
+    
+    parts = [f"Search results for: {query}\n"]
+    append = parts.append
+    
+    for idx, result in enumerate(results, 1):
+        append(f"\n{idx}. {result.get('title', 'No title')}")
+        append(f"   URL: {result.get('url', '')}")
+        # Tavily may return null content, which get() would pass through
+        append(f"   {(result.get('content') or 'No content available')[:MAX_RESULT_CONTENT_CHARS]}")
+    
+    return "\n".join(parts)
+
+
+def _web_search(query: Annotated[str, "The search query to look up on the web"]) -> str:
     """
     Search the web for current information using Tavily API.
     
@@ -19,43 +63,42 @@ def web_search(query: Annotated[str, "The search query to look up on the web"])
     
     Args:
         query: The search query string
-        
+    
     Returns:
         A formatted string containing search results with titles, URLs, and snippets
     """
-    if not tavily_client:
+    if not CONFIG.TAVILY_API_KEY:
         return "Error: Tavily API key not configured. Cannot perform web search."
     
     try:
-        # Perform the search
-        response = tavily_client.search(
-            query=query,
-            max_results=Config.TAVILY_MAX_RESULTS,
-            search_depth="advanced"
-        )
-        
-        # Format the results
-        if not response.get("results"):
-            return f"No results found for query: {query}"
-        
-        formatted_results = [f"Search results for: {query}\n"]
-        
-        for idx, result in enumerate(response["results"], 1):
-            title = result.get("title", "No title")
-            url = result.get("url", "")
-            content = result.get("content", "No content available")
-            
-            formatted_results.append(
-                f"\n{idx}. {title}\n"
-                f"   URL: {url}\n"
-                f"   {content}\n"
-            )
-        
-        return "\n".join(formatted_results)
-        
+        response = _http_client.post(TAVILY_SEARCH_URL, **_search_request(query))
+        response.raise_for_status()
+        return _format_results(query, response.json())
+    
     except Exception as e:
         return f"Error performing web search: {str(e)}"
 
 
+async def _aweb_search(query: str) -> str:
+    """Async variant of the web search that does not block the event loop."""
+    if not CONFIG.TAVILY_API_KEY:
+        return "Error: Tavily API key not configured. Cannot perform web search."
+    
+    try:
+        response = await _async_http_client.post(TAVILY_SEARCH_URL, **_search_request(query))
+        response.raise_for_status()
+        return _format_results(query, response.json())
+    
+    except Exception as e:
+        return f"Error performing web search: {str(e)}"
+
+
+web_search = StructuredTool.from_function(
+    func=_web_search,
+    coroutine=_aweb_search,
+    name="web_search",
+)
+
+
 # List of all available tools
 TOOLS = [web_search]
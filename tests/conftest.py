@@ -0,0 +1,6 @@
+"""Pytest configuration for the AG-UI agent tests."""
+import os
+
+# The servers validate configuration on import, so provide placeholder keys
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ.setdefault("TAVILY_API_KEY", "test-key")
@@ -1,8 +1,79 @@
 """Tests for the AG-UI agent."""
+import asyncio
+import json
+import time
 import pytest
-from unittest.mock import Mock, patch
-from src.ag_ui_agent.agent import create_agent, run_agent
-from src.ag_ui_agent.tools import web_search
+from dataclasses import replace
+from unittest.mock import AsyncMock, Mock, patch
+from langgraph.graph import END
+from langchain_core.messages import AIMessage, ToolMessage
+from fastapi.testclient import TestClient
+from src.ag_ui_agent import server, server_sdk
+from src.ag_ui_agent.agent import SYSTEM_PROMPT, _route_after_agent, _system_message, create_agent, run_agent
+from src.ag_ui_agent.config import CONFIG
+from src.ag_ui_agent.tools import MAX_RESULT_CONTENT_CHARS, web_search
+
+
+def _config(**overrides):
+    """Return a copy of the configuration with the given fields replaced."""
+    return replace(CONFIG, **overrides)
+
+
+def _chunk(text):
+    """Build an LLM token event as emitted by stream_agent."""
+    return {"event": "on_chat_model_stream", "data": {"chunk": Mock(content=text)}}
+
+
+def _tool_start(name="web_search"):
+    """Build a tool start event as emitted by stream_agent."""
+    return {"event": "on_tool_start", "name": name, "data": {"input": {}}}
+
+
+def _fake_stream(*items):
+    """
+    Build a stand-in for stream_agent that replays the given items.
+    
+    Dicts are yielded as events, numbers pause for that many seconds and
+    exceptions are raised.
+    """
+    async def fake_stream_agent(question, agent=None, **kwargs):
+        for item in items:
+            if isinstance(item, Exception):
+                raise item
+            if isinstance(item, (int, float)):
+                await asyncio.sleep(item)
+            else:
+                yield item
+    return fake_stream_agent
+
+
+def _stream(client, message, **params):
+    """Call /api/stream and return the (event, data) pairs received."""
+    body = client.get("/api/stream", params={"message": message, **params}).text
+    events = []
+    for line in body.splitlines():
+        if line.startswith("event: "):
+            name = line[len("event: "):]
+        elif line.startswith("data: "):
+            events.append((name, json.loads(line[len("data: "):])))
+    return events
+
+
+class TestConfig:
+    """Test cases for configuration."""
+    
+    def test_validate_missing_keys(self):
+        """Test that validation reports every missing API key."""
+        with pytest.raises(ValueError) as exc_info:
+            _config(OPENAI_API_KEY=None, TAVILY_API_KEY="").validate()
+        assert "OPENAI_API_KEY" in str(exc_info.value)
+        assert "TAVILY_API_KEY" in str(exc_info.value)
+    
+    def test_config_is_frozen(self):
+        """Test that configuration cannot be changed after loading."""
+        from dataclasses import FrozenInstanceError
+        with pytest.raises(FrozenInstanceError):
+            CONFIG.OPENAI_MODEL = "other"
 
 
 class TestAgent:
@@ -10,10 +81,67 @@ class TestAgent:
     
     def test_agent_creation(self):
         """Test that the agent can be created successfully."""
-        with patch('src.ag_ui_agent.agent.Config.OPENAI_API_KEY', 'test-key'):
-            with patch('src.ag_ui_agent.agent.Config.TAVILY_API_KEY', 'test-key'):
-                agent = create_agent()
-                assert agent is not None
+        with patch('src.ag_ui_agent.agent.CONFIG', _config(OPENAI_API_KEY='test-key', TAVILY_API_KEY='test-key')):
+            agent = create_agent()
+            assert agent is not None
+
+    def test_agent_is_cached(self):
+        """Test that repeated creation reuses the compiled agent."""
+        with patch('src.ag_ui_agent.agent.CONFIG', _config(OPENAI_API_KEY='test-key')):
+            assert create_agent() is create_agent()
+
+    def test_route_after_agent(self):
+        """Test routing to tools only when the LLM requested a tool call."""
+        tool_call = {"name": "web_search", "args": {"query": "q"}, "id": "1"}
+        assert _route_after_agent({"messages": [AIMessage(content="", tool_calls=[tool_call])]}) == "tools"
+        assert _route_after_agent({"messages": [AIMessage(content="Hi")]}) == END
+    
+    def test_system_message_cache_control(self):
+        """Test that the cache marker is only added when enabled."""
+        assert _system_message(False).content == SYSTEM_PROMPT
+        block = _system_message(True).content[0]
+        assert block["text"] == SYSTEM_PROMPT
+        assert block["cache_control"] == {"type": "ephemeral"}
+    
+    @pytest.mark.asyncio
+    async def test_stream_agent_filters_events(self):
+        """Test that only chat model and tool events are streamed by default."""
+        from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+        from src.ag_ui_agent import agent as agent_module
+
+        class FakeChatModel(GenericFakeChatModel):
+            def bind_tools(self, tools, **kwargs):
+                return self
+
+        llm = FakeChatModel(messages=iter([AIMessage(content="Hello there")]))
+        with patch.object(agent_module, '_build_llm', return_value=llm):
+            agent = agent_module._build_agent.__wrapped__(("fake",), False)
+            events = [event["event"] async for event in agent_module.stream_agent("hi", agent)]
+        
+        assert "on_chat_model_stream" in events
+        assert all(e.startswith(("on_chat_model_", "on_tool_")) for e in events)
+    
+    @pytest.mark.asyncio
+    async def test_warmup_uses_async_client(self):
+        """Test that warmup opens the async LLM connection the servers use."""
+        from src.ag_ui_agent import agent as agent_module
+        llm = Mock()
+        llm.bind.return_value.ainvoke = AsyncMock()
+        with patch.object(agent_module, '_build_llm', return_value=llm):
+            await agent_module.warmup_agent()
+        llm.bind.return_value.ainvoke.assert_awaited_once_with("ping")
+        llm.bind.return_value.invoke.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_arun_agent_uses_async_llm(self):
+        """Test that the async agent path never makes a blocking LLM call."""
+        from src.ag_ui_agent import agent as agent_module
+        llm = Mock()
+        llm.bind_tools.return_value.ainvoke = AsyncMock(return_value=AIMessage(content="Paris"))
+        with patch.object(agent_module, '_build_llm', return_value=llm):
+            agent = agent_module._build_agent.__wrapped__(("fake",), False)
+            assert await agent_module.arun_agent("Capital of France?", agent) == "Paris"
+        llm.bind_tools.return_value.invoke.assert_not_called()
     
     @patch('src.ag_ui_agent.agent.ChatOpenAI')
     def test_agent_simple_question(self, mock_llm):
@@ -23,20 +151,19 @@ class TestAgent:
         mock_response.content = "Paris is the capital of France."
         mock_llm.return_value.bind_tools.return_value.invoke.return_value = mock_response
         
-        with patch('src.ag_ui_agent.agent.Config.OPENAI_API_KEY', 'test-key'):
-            with patch('src.ag_ui_agent.agent.Config.TAVILY_API_KEY', 'test-key'):
-                agent = create_agent()
-                # Note: This is a simplified test - actual implementation may require more mocking
+        with patch('src.ag_ui_agent.agent.CONFIG', _config(OPENAI_API_KEY='test-key', TAVILY_API_KEY='test-key')):
+            agent = create_agent()
+            # Note: This is a simplified test - actual implementation may require more mocking
 
 
 class TestWebSearch:
     """Test cases for web search tool."""
     
-    @patch('src.ag_ui_agent.tools.tavily_client')
+    @patch('src.ag_ui_agent.tools._http_client')
     def test_web_search_success(self, mock_client):
         """Test successful web search."""
         # Mock Tavily response
-        mock_client.search.return_value = {
+        mock_client.post.return_value.json.return_value = {
             "results": [
                 {
                     "title": "Test Result",
@@ -46,18 +173,230 @@ class TestWebSearch:
             ]
         }
         
-        with patch('src.ag_ui_agent.tools.Config.TAVILY_API_KEY', 'test-key'):
+        with patch('src.ag_ui_agent.tools.CONFIG', _config(TAVILY_API_KEY='test-key')):
             result = web_search.invoke({"query": "test query"})
             assert "Test Result" in result
             assert "https://example.com" in result
+            request = mock_client.post.call_args.kwargs
+            assert request["json"]["query"] == "test query"
+            assert request["headers"]["Authorization"] == "Bearer test-key"
+    
+    @patch('src.ag_ui_agent.tools._http_client')
+    def test_web_search_truncates_content(self, mock_client):
+        """Test that long result snippets are capped."""
+        mock_client.post.return_value.json.return_value = {
+            "results": [{"title": "Long", "url": "https://example.com", "content": "x" * 5000}]
+        }
+        
+        with patch('src.ag_ui_agent.tools.CONFIG', _config(TAVILY_API_KEY='test-key')):
+            result = web_search.invoke({"query": "test query"})
+            assert "x" * MAX_RESULT_CONTENT_CHARS in result
+            assert "x" * (MAX_RESULT_CONTENT_CHARS + 1) not in result
+    
+    @patch('src.ag_ui_agent.tools._http_client')
+    def test_web_search_null_content(self, mock_client):
+        """Test that results with null content are still formatted."""
+        mock_client.post.return_value.json.return_value = {
+            "results": [{"title": "Empty", "url": "https://example.com", "content": None}]
+        }
+        
+        with patch('src.ag_ui_agent.tools.CONFIG', _config(TAVILY_API_KEY='test-key')):
+            result = web_search.invoke({"query": "test query"})
+            assert "No content available" in result
+            assert "Error" not in result
+    
+    @pytest.mark.asyncio
+    async def test_web_search_async(self):
+        """Test that async invocation uses the shared async client."""
+        response = Mock()
+        response.json.return_value = {
+            "results": [{"title": "Async Result", "url": "https://example.com"}]
+        }
+        
+        with patch('src.ag_ui_agent.tools._async_http_client') as mock_client, \
+                patch('src.ag_ui_agent.tools.CONFIG', _config(TAVILY_API_KEY='test-key')):
+            mock_client.post = AsyncMock(return_value=response)
+            result = await web_search.ainvoke({"query": "test query"})
+            assert "Async Result" in result
+            mock_client.post.assert_awaited_once()
     
     def test_web_search_no_api_key(self):
         """Test web search without API key."""
-        with patch('src.ag_ui_agent.tools.tavily_client', None):
+        with patch('src.ag_ui_agent.tools.CONFIG', _config(TAVILY_API_KEY=None)):
             result = web_search.invoke({"query": "test query"})
             assert "Error" in result
             assert "not configured" in result
 
 
+class TestServerSDK:
+    """Test cases for the SDK server helpers."""
+    
+    def test_sse_frame(self):
+        """Test SSE frame encoding."""
+        frame = server_sdk._sse_frame(b"message", {"type": "message", "content": "hi"})
+        assert frame == b'event: message\ndata: {"type":"message","content":"hi"}\n\n'
+    
+    def test_health(self):
+        """Test the health endpoint response."""
+        response = TestClient(server_sdk.app).get("/health")
+        assert response.headers["content-type"] == "application/json"
+        assert response.json()["status"] == "healthy"
+    
+    def test_stream_completion_metadata(self):
+        """Test that the stream reports a token count and echoes only on request."""
+        client = TestClient(server_sdk.app)
+        with patch.object(server_sdk, 'stream_agent', _fake_stream(_chunk("Hello"), _chunk(" world"))):
+            events = _stream(client, "hi")
+            assert events[-1] == ("state_update", {"type": "state_update", "content": "completed", "metadata": {"tokens": 2}})
+            
+            events = _stream(client, "hi", echo="true")
+            assert events[-1][1]["metadata"]["full_response"] == "Hello world"
+    
+    def test_stream_coalesced_frames_keep_order(self):
+        """Test that coalesced message frames are all sent before a tool event."""
+        stream = _fake_stream(*[_chunk(str(i)) for i in range(10)], _tool_start())
+        with patch.object(server_sdk, 'stream_agent', stream):
+            events = _stream(TestClient(server_sdk.app), "hi")
+        
+        names = [name for name, _ in events]
+        assert names == ["state_update"] + ["message"] * 10 + ["tool_start", "state_update"]
+    
+    @pytest.mark.asyncio
+    async def test_stream_flushes_while_agent_stalls(self):
+        """Test that buffered chunks are sent on time while the agent is stalled."""
+        with patch.object(server_sdk, 'stream_agent', _fake_stream(_chunk("a"), _chunk("b"), 1, _chunk("c"))):
+            response = await server_sdk.stream_chat("hi")
+            start = time.monotonic()
+            received = b""
+            try:
+                async for frame in response.body_iterator:
+                    received += frame
+                    if b'"content":"b"' in received:
+                        break
+            finally:
+                await response.body_iterator.aclose()
+        
+        assert b'"content":"a"' in received
+        assert time.monotonic() - start < 0.5
+    
+    def test_stream_error_frame(self):
+        """Test that a failing agent produces a well-formed error event."""
+        with patch.object(server_sdk, 'stream_agent', _fake_stream(RuntimeError('bad "quote"'))):
+            events = _stream(TestClient(server_sdk.app), "hi")
+        
+        assert events[0][0] == "state_update"
+        assert events[-1] == ("error", {"type": "error", "content": 'bad "quote"', "metadata": {}})
+
+
+class TestServer:
+    """Test cases for the custom AG-UI server."""
+    
+    def test_lifespan_survives_failed_warmup(self):
+        """Test that startup initializes the agent even if warmup fails, and shutdown closes the HTTP clients."""
+        fake_agent = Mock()
+        close_clients = AsyncMock()
+        with patch.object(server, 'agent', None), \
+                patch.object(server, 'create_agent', return_value=fake_agent), \
+                patch.object(server, 'warmup_agent', AsyncMock(side_effect=RuntimeError("offline"))), \
+                patch.object(server, 'aclose_http_clients', close_clients):
+            with TestClient(server.app) as client:
+                assert client.get("/health").json() == {"status": "healthy"}
+                assert server.agent is fake_agent
+                close_clients.assert_not_called()
+            close_clients.assert_awaited_once()
+    
+    def test_lifespan_skips_disabled_warmup(self):
+        """Test that startup does not call the LLM when warmup is disabled."""
+        warmup = AsyncMock()
+        with patch.object(server, 'agent', None), \
+                patch.object(server, 'create_agent', return_value=Mock()), \
+                patch.object(server, 'warmup_agent', warmup), \
+                patch.object(server, 'aclose_http_clients', AsyncMock()), \
+                patch.object(server, 'CONFIG', _config(WARMUP_LLM=False)):
+            with TestClient(server.app):
+                pass
+        warmup.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_batched_events_merge_and_backpressure(self):
+        """Test that queued events are merged into batches and read-ahead is bounded."""
+        produced = []
+        
+        async def events():
+            for i in range(40):
+                produced.append(i)
+                yield i
+        
+        batches = []
+        async for batch in server._batched_events(events(), max_batch=8):
+            # The pump may only run ahead by the queue size plus one pending put
+            assert len(produced) <= sum(map(len, batches)) + len(batch) + 8 + 1
+            batches.append(batch)
+            await asyncio.sleep(0)
+        
+        assert [i for batch in batches for i in batch] == list(range(40))
+        assert max(map(len, batches)) == 8
+        assert len(batches) < 40
+        
+    def test_chat_fast_path(self):
+        """Test that /api/chat skips the graph only when bypass_tools is set."""
+        client = TestClient(server.app)
+        with patch.object(server, 'run_agent_fast', AsyncMock(return_value="fast")), \
+                patch.object(server, 'arun_agent', AsyncMock(return_value="full")):
+            for question in (
+                "What is Python?",
+                "What is the weather in Paris right now?",
+                "Who won the Champions League final yesterday?",
+            ):
+                assert client.post("/api/chat", json={"message": question}).json()["content"] == "full"
+            response = client.post("/api/chat", json={"message": "What is Python?", "bypass_tools": True})
+            assert response.json()["content"] == "fast"
+    
+    def test_stream_error_event(self):
+        """Test that a failing agent produces a well-formed error event."""
+        with patch.object(server, 'stream_agent', _fake_stream(RuntimeError('bad "quote"'))):
+            events = _stream(TestClient(server.app), "hi")
+        
+        assert events[0][0] == "state_update"
+        assert events[-1] == ("error", {"type": "error", "content": 'bad "quote"', "metadata": {}})
+    
+    def test_stream_error_after_chunks(self):
+        """Test that chunks queued in the same batch as an agent error are sent before it."""
+        stream = _fake_stream(_chunk("Hello"), _chunk(" world"), RuntimeError("boom"))
+        with patch.object(server, 'stream_agent', stream):
+            events = _stream(TestClient(server.app), "hi")
+        
+        names = [name for name, _ in events]
+        assert names[0] == "state_update"
+        assert names[-1] == "error"
+        assert "state_update" not in names[1:]
+        # Both chunks were queued with the error, so they share one frame
+        messages = [data["content"] for name, data in events if name == "message"]
+        assert messages == ["Hello world"]
+        assert events[-1][1] == {"type": "error", "content": "boom", "metadata": {}}
+    
+    def test_stream_events(self):
+        """Test that streamed chunks and tool events arrive in order."""
+        stream = _fake_stream(
+            _chunk("Let me "),
+            _chunk("search."),
+            _tool_start(),
+            {"event": "on_tool_end", "name": "web_search", "data": {"output": ToolMessage(content="results", tool_call_id="1")}},
+            _chunk("Done."),
+        )
+        with patch.object(server, 'stream_agent', stream):
+            events = _stream(TestClient(server.app), "hi")
+        
+        names = [name for name, _ in events]
+        assert names[0] == "state_update"
+        assert names.index("message") < names.index("tool_start") < names.index("tool_end")
+        messages = [data["content"] for name, data in events if name == "message"]
+        assert "".join(messages) == "Let me search.Done."
+        tool_end = events[names.index("tool_end")][1]
+        assert tool_end["content"] == "web_search"
+        assert tool_end["metadata"]["tool_output"] == "results"
+        assert events[-1][1]["metadata"] == {"tokens": 3}
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])